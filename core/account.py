@@ -6,6 +6,7 @@ import asyncio
 import json
 import logging
 import os
+import threading
 import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
@@ -24,6 +25,12 @@ if os.path.exists("/data"):
 else:
     ACCOUNTS_FILE = "data/accounts.json"  # 本地存储（统一到 data 目录）
 
+# 注册服务追加写入的账户，注册任务结束或下次加载 ACCOUNTS_FILE 时合并
+ACCOUNTS_JOURNAL_FILE = os.path.splitext(ACCOUNTS_FILE)[0] + ".jsonl"
+
+# 读写 ACCOUNTS_FILE / ACCOUNTS_JOURNAL_FILE 共用的锁（注册服务的后台线程也会写入）
+ACCOUNTS_LOCK = threading.RLock()
+
 
 @dataclass
 class AccountConfig:
@@ -314,12 +321,73 @@ class MultiAccountManager:
 # ---------- 配置文件管理 ----------
 
 def save_accounts_to_file(accounts_data: list):
-    """保存账户配置到文件"""
-    with open(ACCOUNTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(accounts_data, f, ensure_ascii=False, indent=2)
+    """
+    保存账户配置到文件
+
+    不处理 ACCOUNTS_JOURNAL_FILE：读取-修改-保存的调用方通过 load_accounts_from_source 读取时，
+    待合并账户已先由 flush_accounts_journal 并入 ACCOUNTS_FILE
+    """
+    with ACCOUNTS_LOCK:
+        os.makedirs(os.path.dirname(ACCOUNTS_FILE) or ".", exist_ok=True)
+        with open(ACCOUNTS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(accounts_data, f, ensure_ascii=False, indent=2)
     logger.info(f"[CONFIG] 配置已保存到 {ACCOUNTS_FILE}")
 
 
+def append_account_to_journal(account: dict):
+    """追加一个新注册的账户到 ACCOUNTS_JOURNAL_FILE"""
+    with ACCOUNTS_LOCK:
+        os.makedirs(os.path.dirname(ACCOUNTS_JOURNAL_FILE) or ".", exist_ok=True)
+        with open(ACCOUNTS_JOURNAL_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(account, ensure_ascii=False) + "\n")
+
+
+def read_accounts_journal() -> list:
+    """读取 ACCOUNTS_JOURNAL_FILE 中尚未合并的账户（跳过损坏的行）"""
+    if not os.path.exists(ACCOUNTS_JOURNAL_FILE):
+        return []
+
+    pending = []
+    with ACCOUNTS_LOCK, open(ACCOUNTS_JOURNAL_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                pending.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"[CONFIG] 跳过损坏的 {ACCOUNTS_JOURNAL_FILE} 记录: {line[:50]}")
+    return pending
+
+
+def _merge_journal(accounts_data: list) -> list:
+    """把待合并账户追加到 accounts_data（已存在的ID跳过）"""
+    known_ids = {acc.get("id") for acc in accounts_data}
+    for acc in read_accounts_journal():
+        if acc.get("id") not in known_ids:
+            known_ids.add(acc.get("id"))
+            accounts_data.append(acc)
+    return accounts_data
+
+
+def flush_accounts_journal() -> Optional[int]:
+    """
+    把 ACCOUNTS_JOURNAL_FILE 合并进 ACCOUNTS_FILE，返回合并后的账户数，无需合并时返回 None
+
+    只有合并写入成功后才删除 ACCOUNTS_JOURNAL_FILE；ACCOUNTS_FILE 损坏时抛出异常并保留待合并账户
+    """
+    with ACCOUNTS_LOCK:
+        if not os.path.exists(ACCOUNTS_JOURNAL_FILE):
+            return None
+        accounts_data = []
+        if os.path.exists(ACCOUNTS_FILE):
+            with open(ACCOUNTS_FILE, 'r', encoding='utf-8') as f:
+                accounts_data = json.load(f)
+        save_accounts_to_file(_merge_journal(accounts_data))
+        os.remove(ACCOUNTS_JOURNAL_FILE)
+        return len(accounts_data)
+
+
 def load_accounts_from_source() -> list:
     """从环境变量或文件加载账户配置，优先使用环境变量"""
     # 优先从环境变量加载
@@ -331,14 +399,19 @@ def load_accounts_from_source() -> list:
                 logger.info(f"[CONFIG] 从环境变量加载配置，共 {len(accounts_data)} 个账户")
             else:
                 logger.warning(f"[CONFIG] 环境变量 ACCOUNTS_CONFIG 为空")
-            return accounts_data
+            return _merge_journal(accounts_data)
         except Exception as e:
             logger.error(f"[CONFIG] 环境变量加载失败: {str(e)}，尝试从文件加载")
 
-    # 从文件加载
+    # 从文件加载（先把待合并账户并入文件，之后保存完整列表时不会丢失或重新加入账户）
+    try:
+        flush_accounts_journal()
+    except Exception as e:
+        logger.warning(f"[CONFIG] 合并 {ACCOUNTS_JOURNAL_FILE} 失败: {str(e)}")
+
     if os.path.exists(ACCOUNTS_FILE):
         try:
-            with open(ACCOUNTS_FILE, 'r', encoding='utf-8') as f:
+            with ACCOUNTS_LOCK, open(ACCOUNTS_FILE, 'r', encoding='utf-8') as f:
                 accounts_data = json.load(f)
             if accounts_data:
                 logger.info(f"[CONFIG] 从文件加载配置: {ACCOUNTS_FILE}，共 {len(accounts_data)} 个账户")
@@ -348,11 +421,13 @@ def load_accounts_from_source() -> list:
         except Exception as e:
             logger.warning(f"[CONFIG] 文件加载失败: {str(e)}，创建空配置")
 
-    # 文件不存在，创建空配置
+    # 文件不存在或无法解析，创建空配置（保留尚未合并的账户，ACCOUNTS_JOURNAL_FILE 不删除）
     logger.warning(f"[CONFIG] 未找到 {ACCOUNTS_FILE}，已创建空配置文件")
     logger.info(f"[CONFIG] 💡 请在管理面板添加账户，或直接编辑 {ACCOUNTS_FILE}，或使用批量上传功能，或设置环境变量 ACCOUNTS_CONFIG")
-    save_accounts_to_file([])
-    return []
+    with ACCOUNTS_LOCK:
+        accounts_data = _merge_journal([])
+        save_accounts_to_file(accounts_data)
+    return accounts_data
 
 
 def get_account_id(acc: dict, index: int) -> str:
@@ -485,18 +560,20 @@ def delete_account(
     global_stats: dict
 ) -> MultiAccountManager:
     """删除单个账户"""
-    accounts_data = load_accounts_from_source()
-
-    # 过滤掉要删除的账户
-    filtered = [
-        acc for i, acc in enumerate(accounts_data, 1)
-        if get_account_id(acc, i) != account_id
-    ]
+    # 读取到保存期间持有锁，避免期间新注册的账户被清空
+    with ACCOUNTS_LOCK:
+        accounts_data = load_accounts_from_source()
+
+        # 过滤掉要删除的账户
+        filtered = [
+            acc for i, acc in enumerate(accounts_data, 1)
+            if get_account_id(acc, i) != account_id
+        ]
 
-    if len(filtered) == len(accounts_data):
-        raise ValueError(f"账户 {account_id} 不存在")
+        if len(filtered) == len(accounts_data):
+            raise ValueError(f"账户 {account_id} 不存在")
 
-    save_accounts_to_file(filtered)
+        save_accounts_to_file(filtered)
     return reload_accounts(
         multi_account_mgr,
         http_client,
@@ -520,20 +597,21 @@ def update_account_disabled_status(
     global_stats: dict
 ) -> MultiAccountManager:
     """更新账户的禁用状态"""
-    accounts_data = load_accounts_from_source()
+    with ACCOUNTS_LOCK:
+        accounts_data = load_accounts_from_source()
 
-    # 查找并更新账户
-    found = False
-    for i, acc in enumerate(accounts_data, 1):
-        if get_account_id(acc, i) == account_id:
-            acc["disabled"] = disabled
-            found = True
-            break
+        # 查找并更新账户
+        found = False
+        for i, acc in enumerate(accounts_data, 1):
+            if get_account_id(acc, i) == account_id:
+                acc["disabled"] = disabled
+                found = True
+                break
 
-    if not found:
-        raise ValueError(f"账户 {account_id} 不存在")
+        if not found:
+            raise ValueError(f"账户 {account_id} 不存在")
 
-    save_accounts_to_file(accounts_data)
+        save_accounts_to_file(accounts_data)
     new_mgr = reload_accounts(
         multi_account_mgr,
         http_client,
@@ -35,6 +35,8 @@ class BasicConfig(BaseModel):
     email_domain: list = Field(default=[], description="Cloudflare邮箱域名列表")
     chatgpt_mail_api: str = Field(default="", description="ChatGPT Mail API地址")
     chatgpt_mail_key: str = Field(default="", description="ChatGPT Mail API密钥")
+    chatgpt_mail_long_poll: int = Field(default=0, ge=0, description="ChatGPT Mail长轮询等待秒数（0为普通轮询）")
+    mail_ca_bundle: str = Field(default="", description="Cloudflare邮箱API的CA证书路径（留空使用系统证书）")
     mail_provider: str = Field(default="cloudflare", description="邮箱服务类型 (cloudflare/chatgpt)")
     mail_provider_supports_refresh: bool = Field(default=True, description="邮箱服务是否支持刷新token")
     register_number: int = Field(default=5, ge=1, le=100, description="注册临时邮箱数量")
@@ -159,6 +161,8 @@ class ConfigManager:
             email_domain=email_domain_value,
             chatgpt_mail_api=basic_data.get("chatgpt_mail_api") or os.getenv("CHATGPT_MAIL_API", ""),
             chatgpt_mail_key=basic_data.get("chatgpt_mail_key") or os.getenv("CHATGPT_MAIL_KEY", ""),
+            chatgpt_mail_long_poll=basic_data.get("chatgpt_mail_long_poll") or int(os.getenv("CHATGPT_MAIL_LONG_POLL", 0)),
+            mail_ca_bundle=basic_data.get("mail_ca_bundle") or os.getenv("MAIL_CA_BUNDLE", ""),
             mail_provider=basic_data.get("mail_provider") or os.getenv("MAIL_PROVIDER", "cloudflare"),
             mail_provider_supports_refresh=basic_data.get("mail_provider_supports_refresh", True) if "mail_provider_supports_refresh" in basic_data else os.getenv("MAIL_PROVIDER_SUPPORTS_REFRESH", "true").lower() == "true",
             register_number=basic_data.get("register_number") or int(os.getenv("REGISTER_NUMBER", 5))
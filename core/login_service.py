@@ -5,8 +5,6 @@ Gemini Business 登录刷新服务
 艹，这个SB模块需要 Chrome 环境才能跑，别在没 Chrome 的容器里调用
 """
 import asyncio
-import json
-import os
 import time
 import logging
 import uuid
@@ -14,12 +12,12 @@ from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from pathlib import Path
 from typing import Optional, List, Dict, Any
 
 from dotenv import load_dotenv
 
-from util.gemini_auth_utils import GeminiAuthConfig, GeminiAuthHelper
+from core.account import ACCOUNTS_LOCK, load_accounts_from_source, save_accounts_to_file
+from util.gemini_auth_utils import GeminiAuthConfig, GeminiAuthHelper, build_chrome_options
 
 # 加载环境变量
 load_dotenv()
@@ -70,11 +68,6 @@ class LoginService:
         self._executor = ThreadPoolExecutor(max_workers=1)
         self._tasks: Dict[str, LoginTask] = {}
         self._current_task_id: Optional[str] = None
-        # 数据目录配置（与 main.py 保持一致）
-        if os.path.exists("/data"):
-            self.output_dir = Path("/data")
-        else:
-            self.output_dir = Path("./data")
         self._polling_task: Optional[asyncio.Task] = None
         self._is_polling = False
 
@@ -94,36 +87,31 @@ class LoginService:
 
     def _update_account_config(self, email: str, data: dict) -> Optional[dict]:
         """更新账户配置到 accounts.json"""
-        accounts_file = self.output_dir / "accounts.json"
-
-        # 读取现有配置
-        accounts = []
-        if accounts_file.exists():
+        with ACCOUNTS_LOCK:
+            # 读取现有配置（包含注册服务尚未合并的账户）
             try:
-                with open(accounts_file, 'r') as f:
-                    accounts = json.load(f)
-            except:
+                accounts = load_accounts_from_source()
+            except Exception:
                 accounts = []
 
-        # 查找并更新对应账户
-        updated = False
-        for account in accounts:
-            if account.get("id") == email:
-                account["csesidx"] = data["csesidx"]
-                account["config_id"] = data["config_id"]
-                account["secure_c_ses"] = data["secure_c_ses"]
-                account["host_c_oses"] = data["host_c_oses"]
-                account["expires_at"] = data.get("expires_at")
-                updated = True
-                break
-
-        if not updated:
-            logger.warning(f"[LOGIN] 账户 {email} 不存在于 accounts.json，跳过更新")
-            return None
-
-        # 保存配置
-        with open(accounts_file, 'w') as f:
-            json.dump(accounts, f, indent=2, ensure_ascii=False)
+            # 查找并更新对应账户
+            updated = False
+            for account in accounts:
+                if account.get("id") == email:
+                    account["csesidx"] = data["csesidx"]
+                    account["config_id"] = data["config_id"]
+                    account["secure_c_ses"] = data["secure_c_ses"]
+                    account["host_c_oses"] = data["host_c_oses"]
+                    account["expires_at"] = data.get("expires_at")
+                    updated = True
+                    break
+
+            if not updated:
+                logger.warning(f"[LOGIN] 账户 {email} 不存在于 accounts.json，跳过更新")
+                return None
+
+            # 保存配置
+            save_accounts_to_file(accounts)
 
         logger.info(f"✅ 配置已更新: {email}")
         return data
@@ -146,21 +134,7 @@ class LoginService:
         try:
             logger.info(f"🔄 开始刷新登录: {email}")
             
-            # 配置 Chrome 选项（增加稳定性，减少崩溃）
-            options = uc.ChromeOptions()
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--disable-software-rasterizer')
-            options.add_argument('--disable-extensions')
-            options.add_argument('--window-size=1920,1080')
-            # 增加内存限制，避免崩溃
-            options.add_argument('--js-flags=--max-old-space-size=512')
-            # 禁用一些可能导致崩溃的特性
-            options.add_argument('--disable-background-networking')
-            options.add_argument('--disable-default-apps')
-            options.add_argument('--disable-sync')
-            
+            options = build_chrome_options()
             driver = uc.Chrome(options=options, use_subprocess=True)
             wait = WebDriverWait(driver, 30)
 
@@ -257,15 +231,9 @@ class LoginService:
 
     def _get_expiring_accounts(self) -> List[str]:
         """获取1小时内即将过期的账户ID列表"""
-        accounts_file = self.output_dir / "accounts.json"
-
-        if not accounts_file.exists():
-            return []
-
         try:
-            with open(accounts_file, 'r') as f:
-                accounts = json.load(f)
-        except:
+            accounts = load_accounts_from_source()
+        except Exception:
             return []
 
         expiring = []
@@ -5,24 +5,25 @@ Gemini Business 注册服务
 艹，这个SB模块需要 Chrome 环境才能跑，别在没 Chrome 的容器里调用
 """
 import asyncio
-import json
 import os
+import queue
+import threading
 import time
 import random
 import logging
 import uuid
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import Future
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from pathlib import Path
-from string import ascii_letters, digits
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Deque
 
-import requests
 from dotenv import load_dotenv
 
-from util.gemini_auth_utils import GeminiAuthConfig, GeminiAuthHelper
+from core.account import append_account_to_journal, flush_accounts_journal
+from core.config import get_config
+from util.gemini_auth_utils import GeminiAuthConfig, GeminiAuthHelper, build_chrome_options, run_blocking
 from util.mail_providers import create_mail_provider_from_config, MailProvider
 
 # 加载环境变量
@@ -30,6 +31,17 @@ load_dotenv()
 
 logger = logging.getLogger("gemini.register")
 
+# 并发注册数（同时存活的 Chrome 实例数）
+REGISTER_POOL_SIZE = max(1, int(os.getenv("REGISTER_POOL_SIZE", "3")))
+# 每分钟最多发起的 Google 登录次数 / 邮箱创建次数（0 表示不限速）
+REGISTER_RATE_PER_MIN = float(os.getenv("REGISTER_RATE_PER_MIN", "10"))
+MAIL_RATE_PER_MIN = float(os.getenv("MAIL_RATE_PER_MIN", "20"))
+
+# 最多保留的任务数 / 已结束任务的保留时间（秒）/ 单个任务最多保留的结果数
+MAX_TASKS = max(1, int(os.getenv("REGISTER_MAX_TASKS", "50")))
+TASK_TTL_SECONDS = float(os.getenv("REGISTER_TASK_TTL", "3600"))
+RESULTS_CAP = 1000
+
 
 class RegisterStatus(str, Enum):
     PENDING = "pending"
@@ -38,7 +50,7 @@ class RegisterStatus(str, Enum):
     FAILED = "failed"
 
 
-@dataclass
+@dataclass(slots=True)
 class RegisterTask:
     """注册任务"""
     id: str
@@ -49,11 +61,19 @@ class RegisterTask:
     fail_count: int = 0
     created_at: float = field(default_factory=time.time)
     finished_at: Optional[float] = None
-    results: List[Dict[str, Any]] = field(default_factory=list)
+    results: Deque[Dict[str, Any]] = field(default_factory=lambda: deque(maxlen=RESULTS_CAP))
     error: Optional[str] = None
+    # to_dict() 结果缓存，只有进度或状态变化后才重新序列化
+    _cached_dict: Optional[dict] = field(default=None, repr=False, compare=False)
+    _cached_key: Optional[tuple] = field(default=None, repr=False, compare=False)
 
     def to_dict(self) -> dict:
-        return {
+        # results / 计数只会随 progress 变化，前端轮询时大部分请求可直接命中缓存
+        key = (self.status, self.progress, self.finished_at, self.error)
+        if self._cached_dict is not None and self._cached_key == key:
+            return self._cached_dict
+
+        self._cached_dict = {
             "id": self.id,
             "count": self.count,
             "status": self.status.value,
@@ -62,64 +82,246 @@ class RegisterTask:
             "fail_count": self.fail_count,
             "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
             "finished_at": datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None,
-            "results": self.results,
+            "results": list(self.results),
             "error": self.error
         }
+        self._cached_key = key
+        return self._cached_dict
+
+
+class TokenBucket:
+    """
+    异步令牌桶限速器
+
+    按 rate_per_min 匀速补充令牌，最多积攒 capacity 个，acquire 拿不到令牌时等待；
+    所有任务共用同一个桶，限制的是总速率而不是单次间隔
+    """
+
+    def __init__(self, rate_per_min: float, capacity: int = 1):
+        self.rate = rate_per_min / 60
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChromeDriverPool:
+    """
+    Chrome 实例池
+
+    按需启动，最多同时存在 size 个实例；注册完成后清理状态放回池中复用，
+    避免每次注册都冷启动一次 Chrome
+    """
+
+    # 归还实例时需要清理存储的站点
+    RESET_ORIGINS = (
+        "https://auth.business.gemini.google",
+        "https://business.gemini.google",
+    )
+
+    def __init__(self, size: int = REGISTER_POOL_SIZE):
+        self.size = max(1, size)
+        self._idle: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        # undetected_chromedriver 启动时会改写 chromedriver 文件，并发启动会冲突
+        self._launch_lock = threading.Lock()
+        self._created = 0
+        # close() 时递增；借出期间经历过 close() 的实例归还时直接销毁，不再放回池中
+        self._generation = 0
+        self._generations: Dict[Any, int] = {}
+
+    def _launch(self):
+        import undetected_chromedriver as uc
+
+        options = build_chrome_options()
+
+        with self._launch_lock:
+            return uc.Chrome(options=options, use_subprocess=True)
+
+    def acquire(self, timeout: Optional[float] = None):
+        """取出一个空闲实例，没有空闲且未达上限时启动新实例，否则阻塞等待归还"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_launch = self._created < self.size
+            if can_launch:
+                self._created += 1
+
+        if not can_launch:
+            return self._idle.get(timeout=timeout)
+
+        try:
+            driver = self._launch()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._generations[driver] = self._generation
+        return driver
+
+    def release(self, driver) -> None:
+        """清理 cookie / 存储并关闭多余标签页后放回池中，清理失败或实例池已关闭则直接销毁"""
+        with self._lock:
+            stale = self._generations.get(driver) != self._generation
+        if stale:
+            self.discard(driver)
+            return
+
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            for origin in self.RESET_ORIGINS:
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            driver.get("about:blank")
+        except Exception as e:
+            logger.warning(f"⚠️ Chrome 实例重置失败，直接销毁: {e}")
+            self.discard(driver)
+            return
+
+        # 清理期间实例池可能已关闭，加锁确认后再放回
+        with self._lock:
+            stale = self._generations.get(driver) != self._generation
+            if not stale:
+                self._idle.put(driver)
+        if stale:
+            self.discard(driver)
+
+    def discard(self, driver) -> None:
+        """销毁实例并释放名额"""
+        try:
+            driver.quit()
+        except:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._generations.pop(driver, None)
+
+    def close(self) -> None:
+        """
+        销毁所有空闲实例（任务结束后调用，避免空闲 Chrome 常驻内存）
+
+        仍被借出的实例在归还时销毁
+        """
+        with self._lock:
+            self._generation += 1
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(driver)
 
 
 class RegisterService:
 
-    NAMES = [
+    NAMES = (
         "James Smith", "John Johnson", "Robert Williams", "Michael Brown", "William Jones",
         "David Garcia", "Mary Miller", "Patricia Davis", "Jennifer Rodriguez", "Linda Martinez"
-    ]
+    )
 
     def __init__(self):
-        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pool = ChromeDriverPool(REGISTER_POOL_SIZE)
+        # 邮箱创建和 Google 登录分别限速，避免触发风控
+        self._mail_bucket = TokenBucket(MAIL_RATE_PER_MIN)
+        self._google_bucket = TokenBucket(REGISTER_RATE_PER_MIN)
         self._tasks: Dict[str, RegisterTask] = {}
         self._current_task_id: Optional[str] = None
         self._email_queue: List[str] = []
-        if os.path.exists("/data"):
-            self.output_dir = Path("/data")
-        else:
-            self.output_dir = Path("./data")
         self._specified_domain: Optional[str] = None
         self._mail_provider: Optional[MailProvider] = None
+        self._auth_config: Optional[GeminiAuthConfig] = None
+        self._auth_helper: Optional[GeminiAuthHelper] = None
+        # 构建认证对象时对应的配置快照，热更新后 get_config() 会返回新对象
+        self._auth_source = None
+        self._auth_lock = threading.Lock()
+
+    def _ensure_auth(self) -> None:
+        """首次使用或配置热更新后重建认证对象，其余时候直接复用"""
+        app_config = get_config()
+        if app_config is self._auth_source:
+            return
+        with self._auth_lock:
+            if app_config is self._auth_source:
+                return
+            # Provider 由 create_mail_provider_from_config 统一缓存和持有，配置变化时旧实例由缓存关闭
+            self._mail_provider = create_mail_provider_from_config()
+            self._auth_config = GeminiAuthConfig()
+            self._auth_helper = GeminiAuthHelper(self._auth_config, self._mail_provider)
+            self._auth_source = app_config
 
     @property
     def auth_config(self) -> GeminiAuthConfig:
-        return GeminiAuthConfig()
+        self._ensure_auth()
+        return self._auth_config
 
     @property
     def auth_helper(self) -> GeminiAuthHelper:
-        return GeminiAuthHelper(self.auth_config)
+        self._ensure_auth()
+        return self._auth_helper
 
     @property
     def mail_provider(self) -> Optional[MailProvider]:
-        if self._mail_provider is None:
-            self._mail_provider = create_mail_provider_from_config()
+        self._ensure_auth()
         return self._mail_provider
 
-    @staticmethod
-    def _random_str(n: int = 10) -> str:
-        return "".join(random.sample(ascii_letters + digits, n))
-
-    def _create_email(self, domain: Optional[str] = None) -> Optional[str]:
+    async def _create_email(self, domain: Optional[str] = None) -> Optional[str]:
         if self.mail_provider is None:
             logger.error("❌ 邮箱服务未配置")
             return None
-        return self.mail_provider.create_email(domain)
+        return await self.mail_provider.create_email_async(domain)
 
-    def _get_email(self) -> Optional[str]:
+    async def _get_email(self) -> Optional[str]:
         if self._email_queue:
             return self._email_queue.pop(0)
-        return self._create_email(self._specified_domain)
+        return await self._create_email(self._specified_domain)
+
+    @staticmethod
+    def _future_email(email_future: Optional[Future]) -> Optional[str]:
+        """取出已完成的邮箱创建结果，未提交、未完成或失败时返回 None"""
+        if email_future is not None and email_future.done() and email_future.exception() is None:
+            return email_future.result()
+        return None
     
+    def _flush_accounts(self) -> None:
+        """把 accounts.jsonl 合并进 accounts.json（任务开始和结束时各执行一次）"""
+        try:
+            total = flush_accounts_journal()
+        except Exception as e:
+            logger.error(f"❌ 合并 accounts.jsonl 失败: {e}")
+            return
+
+        if total is not None:
+            logger.info(f"✅ 已合并注册结果到 accounts.json，共 {total} 个账户")
+
     def _save_config(self, email: str, data: dict) -> Optional[dict]:
-        """保存账户配置到 accounts.json"""
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        accounts_file = self.output_dir / "accounts.json"
+        """
+        保存账户配置到 accounts.jsonl
 
+        每次注册只追加一行，任务结束时再统一合并到 accounts.json，
+        避免每注册一个账户就完整读写一遍 accounts.json
+        """
         config = {
             "id": email,
             "csesidx": data["csesidx"],
@@ -129,134 +331,110 @@ class RegisterService:
             "expires_at": data.get("expires_at")
         }
 
-        # 读取现有配置
-        accounts = []
-        if accounts_file.exists():
-            try:
-                with open(accounts_file, 'r') as f:
-                    accounts = json.load(f)
-            except:
-                accounts = []
-
-        # 追加新账户配置
-        accounts.append(config)
+        append_account_to_journal(config)
 
-        # 保存配置
-        with open(accounts_file, 'w') as f:
-            json.dump(accounts, f, indent=2, ensure_ascii=False)
-
-        logger.info(f"✅ 配置已保存到 accounts.json: {email}")
+        logger.info(f"✅ 配置已保存到 accounts.jsonl: {email}")
         return config
     
-    def _register_one_sync(self) -> Dict[str, Any]:
+    def _fill_name(self, driver, wait) -> bool:
+        """输入姓名并提交 (在线程中运行)，未找到输入框返回 False"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.common.keys import Keys
+        from selenium.common.exceptions import TimeoutException
+
+        # 任一候选输入框可点击即继续
+        selectors = [
+            "input[formcontrolname='fullName']",
+            "input[placeholder='全名']",
+            "input[placeholder='Full name']",
+            "input#mat-input-0",
+        ]
+        try:
+            name_inp = wait.until(EC.any_of(
+                *[EC.element_to_be_clickable((By.CSS_SELECTOR, sel)) for sel in selectors]
+            ))
+        except TimeoutException:
+            return False
+
+        name = random.choice(self.NAMES)
+        name_inp.click()
+        name_inp.clear()
+        name_inp.send_keys(name + Keys.ENTER)
+        return True
+
+    async def _register_one(self) -> Dict[str, Any]:
         """
-        同步执行单次注册 (在线程池中运行)
+        执行单次注册
+
+        每个浏览器操作单独放到线程中执行，等待验证码邮件、等待工作台期间只挂起协程，不占用线程
         返回: {"email": str, "success": bool, "config": dict|None, "error": str|None}
         """
         try:
             # 延迟导入 selenium，因为可能没装
-            import undetected_chromedriver as uc
-            from selenium.webdriver.common.by import By
+            import undetected_chromedriver  # noqa: F401
             from selenium.webdriver.support.ui import WebDriverWait
-            from selenium.webdriver.support import expected_conditions as EC
-            from selenium.webdriver.common.keys import Keys
         except ImportError as e:
             return {"email": None, "success": False, "config": None, "error": f"Selenium 未安装: {e}"}
-        
-        email = self._get_email()
-        if not email:
-            return {"email": None, "success": False, "config": None, "error": "无法创建邮箱"}
 
+        email_future = None
+        email = None
         driver = None
         try:
-            logger.info(f"🚀 开始注册: {email}")
-            
-            # 配置 Chrome 选项（增加稳定性，减少崩溃）
-            options = uc.ChromeOptions()
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--disable-software-rasterizer')
-            options.add_argument('--disable-extensions')
-            options.add_argument('--window-size=1920,1080')
-            # 增加内存限制，避免崩溃
-            options.add_argument('--js-flags=--max-old-space-size=512')
-            # 禁用一些可能导致崩溃的特性
-            options.add_argument('--disable-background-networking')
-            options.add_argument('--disable-default-apps')
-            options.add_argument('--disable-sync')
-            
-            driver = uc.Chrome(options=options, use_subprocess=True)
+            logger.info("🚀 开始注册")
+            helper = self.auth_helper
+
+            # 邮箱创建在事件循环中与 Chrome 启动、登录页加载并行进行，
+            # 包装成线程安全的 Future，输入邮箱的线程再取结果
+            email_future = asyncio.run_coroutine_threadsafe(self._get_email(), asyncio.get_running_loop())
+
+            acquire = asyncio.ensure_future(asyncio.to_thread(self._pool.acquire))
+            try:
+                driver = await asyncio.shield(acquire)
+            except asyncio.CancelledError:
+                # 取消时 Chrome 可能仍在启动：等启动完成，交给 finally 归还
+                await asyncio.wait([acquire])
+                if not acquire.exception():
+                    driver = acquire.result()
+                raise
             wait = WebDriverWait(driver, 30)
 
             # 1. 访问登录页
-            driver.get(self.auth_config.login_url)
-            time.sleep(2)
+            await run_blocking(driver.get, helper.config.login_url)
 
             # 2-6. 执行邮箱验证流程（使用公共方法）
-            verify_result = self.auth_helper.perform_email_verification(driver, wait, email)
+            verify_result = await helper.perform_email_verification_async(driver, wait, email_future)
+            email = self._future_email(email_future)
             if not verify_result["success"]:
                 return {"email": email, "success": False, "config": None, "error": verify_result["error"]}
-            
+            logger.info(f"📧 注册邮箱: {email}")
+
             # 7. 输入姓名
-            time.sleep(2)
-            selectors = [
-                "input[formcontrolname='fullName']",
-                "input[placeholder='全名']",
-                "input[placeholder='Full name']",
-                "input#mat-input-0",
-            ]
-            name_inp = None
-            for _ in range(30):
-                for sel in selectors:
-                    try:
-                        name_inp = driver.find_element(By.CSS_SELECTOR, sel)
-                        if name_inp.is_displayed():
-                            break
-                    except:
-                        continue
-                if name_inp and name_inp.is_displayed():
-                    break
-                time.sleep(1)
-            
-            if name_inp and name_inp.is_displayed():
-                name = random.choice(self.NAMES)
-                name_inp.click()
-                time.sleep(0.2)
-                name_inp.clear()
-                for c in name:
-                    name_inp.send_keys(c)
-                    time.sleep(0.02)
-                time.sleep(0.3)
-                name_inp.send_keys(Keys.ENTER)
-                time.sleep(1)
-            else:
+            if not await run_blocking(self._fill_name, driver, wait):
                 return {"email": email, "success": False, "config": None, "error": "未找到姓名输入框"}
-            
-            # 8. 等待进入工作台（使用公共方法）
-            if not self.auth_helper.wait_for_workspace(driver, timeout=30):
+
+            # 8. 等待进入工作台（使用公共方法，按 URL 判断，无需固定等待）
+            if not await helper.wait_for_workspace_async(driver, timeout=30):
                 return {"email": email, "success": False, "config": None, "error": "未跳转到工作台"}
 
             # 9. 提取配置（使用公共方法，带重试机制处理 tab crashed）
-            extract_result = self.auth_helper.extract_config_with_retry(driver, max_retries=3)
+            extract_result = await run_blocking(helper.extract_config_with_retry, driver, 3)
             if not extract_result["success"]:
                 return {"email": email, "success": False, "config": None, "error": extract_result["error"]}
 
-            config_data = extract_result["config"]
-            
-            config = self._save_config(email, config_data)
+            config = await asyncio.to_thread(self._save_config, email, extract_result["config"])
             logger.info(f"✅ 注册成功: {email}")
             return {"email": email, "success": True, "config": config, "error": None}
-            
+
         except Exception as e:
+            email = email or self._future_email(email_future)
             logger.error(f"❌ 注册异常 [{email}]: {e}")
             return {"email": email, "success": False, "config": None, "error": str(e)}
         finally:
+            if email_future is not None:
+                email_future.cancel()
             if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
+                await asyncio.to_thread(self._pool.release, driver)
     
     async def start_register(self, count: int, domain: Optional[str] = None) -> RegisterTask:
         """
@@ -280,6 +458,7 @@ class RegisterService:
         )
         self._tasks[task.id] = task
         self._current_task_id = task.id
+        self._evict_tasks()
         
         # 在后台线程执行注册
         asyncio.create_task(self._run_register_async(task))
@@ -289,31 +468,70 @@ class RegisterService:
     async def _run_register_async(self, task: RegisterTask):
         """异步执行注册任务"""
         task.status = RegisterStatus.RUNNING
-        loop = asyncio.get_event_loop()
-        
+        # 并发数与 Chrome 实例池大小一致，保证取实例时不会阻塞
+        semaphore = asyncio.Semaphore(self._pool.size)
+
+        # 合并上次异常退出时遗留的注册结果
+        await asyncio.to_thread(self._flush_accounts)
+
+        async def run_one() -> Dict[str, Any]:
+            # 拿到并发名额后再取令牌，避免排队期间提前消耗令牌
+            async with semaphore:
+                await self._mail_bucket.acquire()
+                await self._google_bucket.acquire()
+                return await self._register_one()
+
+        tasks = [asyncio.create_task(run_one()) for _ in range(task.count)]
         try:
-            for i in range(task.count):
-                task.progress = i + 1
-                result = await loop.run_in_executor(self._executor, self._register_one_sync)
+            # 一次性调度全部注册，按完成顺序更新进度，Selenium 阻塞期间事件循环仍可响应查询
+            for fut in asyncio.as_completed(tasks):
+                result = await fut
                 task.results.append(result)
-                
+                task.progress += 1
+
                 if result["success"]:
                     task.success_count += 1
                 else:
                     task.fail_count += 1
-                
-                # 每次注册间隔
-                if i < task.count - 1:
-                    await asyncio.sleep(random.randint(2, 5))
-            
+
             task.status = RegisterStatus.SUCCESS if task.success_count > 0 else RegisterStatus.FAILED
         except Exception as e:
             task.status = RegisterStatus.FAILED
             task.error = str(e)
         finally:
+            # 异常退出时先取消并等待剩余注册，确保它们已归还 Chrome 实例再关闭实例池
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.to_thread(self._pool.close)
+            await asyncio.to_thread(self._flush_accounts)
             task.finished_at = time.time()
             self._current_task_id = None
     
+    def cleanup_finished(self, older_than_sec: float = TASK_TTL_SECONDS) -> int:
+        """清理结束时间早于 older_than_sec 秒前的任务，返回清理数量"""
+        deadline = time.time() - older_than_sec
+        expired = [
+            task_id for task_id, task in self._tasks.items()
+            if task.finished_at is not None and task.finished_at < deadline
+        ]
+        for task_id in expired:
+            del self._tasks[task_id]
+        return len(expired)
+
+    def _evict_tasks(self) -> None:
+        """清理过期任务；仍超过上限时，从最早结束的开始淘汰"""
+        self.cleanup_finished()
+        if len(self._tasks) <= MAX_TASKS:
+            return
+
+        finished = sorted(
+            (task for task in self._tasks.values() if task.finished_at is not None),
+            key=lambda task: task.finished_at
+        )
+        for task in finished[:len(self._tasks) - MAX_TASKS]:
+            del self._tasks[task.id]
+
     def get_task(self, task_id: str) -> Optional[RegisterTask]:
         """获取任务状态"""
         return self._tasks.get(task_id)
@@ -377,6 +377,12 @@ async def startup_event():
     else:
         logger.info("[SYSTEM] 登录服务未启用，跳过轮询任务")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放邮箱服务的共享异步客户端"""
+    from util.mail_providers import close_async_clients
+    await close_async_clients()
+
 # ---------- 日志脱敏函数 ----------
 def get_sanitized_logs(limit: int = 100) -> list:
     """获取脱敏后的日志列表，按请求ID分组并提取关键事件"""
@@ -847,8 +853,10 @@ async def admin_get_settings(request: Request):
             "mail_admin_key": config.basic.mail_admin_key,
             "google_mail": config.basic.google_mail,
             "email_domain": config.basic.email_domain,
+            "mail_ca_bundle": config.basic.mail_ca_bundle,
             "chatgpt_mail_api": config.basic.chatgpt_mail_api,
             "chatgpt_mail_key": config.basic.chatgpt_mail_key,
+            "chatgpt_mail_long_poll": config.basic.chatgpt_mail_long_poll,
             "register_number": config.basic.register_number
         },
         "image_generation": {
@@ -285,8 +285,10 @@ let currentConfig = null;
                     document.getElementById('setting-mail-admin-key').value = settings.basic?.mail_admin_key || '';
                     document.getElementById('setting-google-mail').value = settings.basic?.google_mail || '';
                     document.getElementById('setting-email-domain').value = settings.basic?.email_domain?.join(',') || '';
+                    document.getElementById('setting-mail-ca-bundle').value = settings.basic?.mail_ca_bundle || '';
                     document.getElementById('setting-chatgpt-mail-api').value = settings.basic?.chatgpt_mail_api || '';
                     document.getElementById('setting-chatgpt-mail-key').value = settings.basic?.chatgpt_mail_key || '';
+                    document.getElementById('setting-chatgpt-mail-long-poll').value = settings.basic?.chatgpt_mail_long_poll || 0;
                     document.getElementById('setting-register-number').value = settings.basic?.register_number || 5;
                     toggleMailProviderFields();
                     document.getElementById('setting-register-number').value = settings.basic?.register_number || 5;
@@ -335,8 +337,10 @@ let currentConfig = null;
                             mail_admin_key: document.getElementById('setting-mail-admin-key').value,
                             google_mail: document.getElementById('setting-google-mail').value,
                             email_domain: document.getElementById('setting-email-domain').value.split(',').map(d => d.trim()).filter(d => d),
+                            mail_ca_bundle: document.getElementById('setting-mail-ca-bundle').value,
                             chatgpt_mail_api: document.getElementById('setting-chatgpt-mail-api').value,
                             chatgpt_mail_key: document.getElementById('setting-chatgpt-mail-key').value,
+                            chatgpt_mail_long_poll: parseInt(document.getElementById('setting-chatgpt-mail-long-poll').value) || 0,
                             register_number: parseInt(document.getElementById('setting-register-number').value) || 5
                         },
                         image_generation: {
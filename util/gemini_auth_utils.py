@@ -2,19 +2,70 @@
 Gemini Business 认证工具类
 抽取注册和登录服务的公共逻辑，遵循 DRY 原则
 """
+import asyncio
 import json
+import re
 import time
 import logging
-from typing import Optional, Dict, Any, List
-from urllib.parse import urlparse, parse_qs
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, List, Union
+from urllib.parse import unquote
 from datetime import datetime
 
-import requests
 from core.config import config
 from util.mail_providers import create_mail_provider_from_config, MailProvider
 
 logger = logging.getLogger("gemini.auth_utils")
 
+WORKSPACE_URL = "https://business.gemini.google/"
+
+# Chrome 启动参数（增加稳定性，减少崩溃），注册和登录刷新共用
+CHROME_ARGS = (
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-software-rasterizer',
+    '--disable-extensions',
+    '--window-size=1920,1080',
+    # 增加内存限制，避免崩溃
+    '--js-flags=--max-old-space-size=512',
+    # 禁用一些可能导致崩溃的特性
+    '--disable-background-networking',
+    '--disable-default-apps',
+    '--disable-sync',
+)
+
+# 工作台 URL 形如 https://business.gemini.google/home/cid/<config_id>?csesidx=<idx>
+_CID_RE = re.compile(r'/cid/([^/?#]+)')
+_CSESIDX_RE = re.compile(r'[?&]csesidx=([^&#]+)')
+
+
+def build_chrome_options():
+    """按 CHROME_ARGS 构建 undetected_chromedriver 的启动选项"""
+    import undetected_chromedriver as uc
+
+    options = uc.ChromeOptions()
+    for arg in CHROME_ARGS:
+        options.add_argument(arg)
+    return options
+
+
+async def run_blocking(func, *args):
+    """
+    在线程中执行阻塞的浏览器操作
+
+    协程被取消时先等线程里的操作执行完再抛出 CancelledError：线程无法中断，
+    直接抛出会让调用方的清理（如归还 Chrome 实例）与仍在运行的 Selenium 操作并发
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        await asyncio.wait([task])
+        if not task.cancelled():
+            task.exception()  # 已取消，结果和异常都不再需要
+        raise
+
 
 class GeminiAuthConfig:
     def __init__(self):
@@ -41,10 +92,13 @@ class GeminiAuthHelper:
         "continue_btn": "/html/body/c-wiz/div/div/div[1]/div/div/div/form/div[2]/div/button",
         "verify_btn": "/html/body/c-wiz/div/div/div[1]/div/div/div/form/div[2]/div/div[1]/span/div[1]/button",
     }
+    # 验证码输入框的两种形态：单个 input 或逐位 span
+    PIN_SELECTOR = "input[name='pinInput'], span[data-index='0']"
 
-    def __init__(self, config: GeminiAuthConfig):
+    def __init__(self, config: GeminiAuthConfig, mail_provider: Optional[MailProvider] = None):
         self.config = config
-        self._mail_provider: Optional[MailProvider] = None
+        # 调用方可传入已创建的邮箱服务共用，未传入时首次使用再创建
+        self._mail_provider: Optional[MailProvider] = mail_provider
 
     @property
     def mail_provider(self) -> Optional[MailProvider]:
@@ -58,12 +112,19 @@ class GeminiAuthHelper:
             return None
         return self.mail_provider.get_verification_code(email, self.config.google_mail, timeout)
 
-    def perform_email_verification(self, driver, wait, email: str) -> Dict[str, Any]:
+    async def get_verification_code_async(self, email: str, timeout: int = 60) -> Optional[str]:
+        if self.mail_provider is None:
+            logger.error("❌ 邮箱服务未配置")
+            return None
+        return await self.mail_provider.get_verification_code_async(email, self.config.google_mail, timeout)
+
+    def submit_email(self, driver, wait, email: Union[str, Future]) -> Dict[str, Any]:
         """
-        执行邮箱验证流程（公共方法）
-        从输入邮箱到验证码验证完成
+        输入邮箱并点击继续，直到验证码输入页出现
 
-        返回: {"success": bool, "error": str|None}
+        email 可以是尚未完成的 Future（邮箱创建与页面加载并行），输入邮箱前才取结果
+
+        返回: {"success": bool, "email": str|None, "error": str|None}
         """
         try:
             from selenium.webdriver.common.by import By
@@ -71,27 +132,44 @@ class GeminiAuthHelper:
 
             # 1. 输入邮箱
             inp = wait.until(EC.element_to_be_clickable((By.XPATH, self.XPATH["email_input"])))
+            if isinstance(email, Future):
+                try:
+                    email = email.result(timeout=30)
+                except FutureTimeoutError:
+                    return {"success": False, "email": None, "error": "邮箱创建超时"}
+                if not email:
+                    return {"success": False, "email": None, "error": "无法创建邮箱"}
             inp.click()
             inp.clear()
-            for c in email:
-                inp.send_keys(c)
-                time.sleep(0.02)
+            inp.send_keys(email)
 
             # 2. 点击继续
             time.sleep(0.5)
             btn = wait.until(EC.element_to_be_clickable((By.XPATH, self.XPATH["continue_btn"])))
             driver.execute_script("arguments[0].click();", btn)
-            time.sleep(2)
 
-            # 3. 获取验证码
-            code = self.get_verification_code(email)
-            if not code:
-                return {"success": False, "error": "验证码超时"}
+            # 等待验证码输入页出现（说明验证码邮件已发出）
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, self.PIN_SELECTOR)))
+
+            return {"success": True, "email": email, "error": None}
+
+        except Exception as e:
+            return {"success": False, "email": None, "error": str(e)}
+
+    def submit_code(self, driver, code: str) -> Dict[str, Any]:
+        """
+        输入验证码并点击验证按钮
+
+        返回: {"success": bool, "error": str|None}
+        """
+        try:
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support.ui import WebDriverWait
+            from selenium.webdriver.support import expected_conditions as EC
 
             # 4. 输入验证码
-            time.sleep(1)
             try:
-                pin = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "input[name='pinInput']")))
+                pin = driver.find_element(By.CSS_SELECTOR, "input[name='pinInput']")
                 pin.click()
                 time.sleep(0.1)
                 for c in code:
@@ -107,9 +185,8 @@ class GeminiAuthHelper:
                     return {"success": False, "error": f"验证码输入失败: {e}"}
 
             # 5. 点击验证按钮
-            time.sleep(0.5)
             try:
-                vbtn = driver.find_element(By.XPATH, self.XPATH["verify_btn"])
+                vbtn = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, self.XPATH["verify_btn"])))
                 driver.execute_script("arguments[0].click();", vbtn)
             except:
                 for btn in driver.find_elements(By.TAG_NAME, "button"):
@@ -122,6 +199,43 @@ class GeminiAuthHelper:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def perform_email_verification(self, driver, wait, email: Union[str, Future]) -> Dict[str, Any]:
+        """
+        执行邮箱验证流程（公共方法）
+        从输入邮箱到验证码验证完成
+
+        返回: {"success": bool, "error": str|None}
+        """
+        submit_result = self.submit_email(driver, wait, email)
+        if not submit_result["success"]:
+            return {"success": False, "error": submit_result["error"]}
+
+        # 3. 获取验证码
+        code = self.get_verification_code(submit_result["email"])
+        if not code:
+            return {"success": False, "error": "验证码超时"}
+
+        return self.submit_code(driver, code)
+
+    async def perform_email_verification_async(self, driver, wait, email: Union[str, Future]) -> Dict[str, Any]:
+        """
+        执行邮箱验证流程（异步版本）
+
+        Selenium 操作放到线程中执行，等待验证码期间不占用线程
+
+        返回: {"success": bool, "error": str|None}
+        """
+        submit_result = await run_blocking(self.submit_email, driver, wait, email)
+        if not submit_result["success"]:
+            return {"success": False, "error": submit_result["error"]}
+
+        # 3. 获取验证码
+        code = await self.get_verification_code_async(submit_result["email"])
+        if not code:
+            return {"success": False, "error": "验证码超时"}
+
+        return await run_blocking(self.submit_code, driver, code)
+
     def extract_config_from_workspace(self, driver) -> Dict[str, Any]:
         """
         从工作台页面提取配置信息（公共方法）
@@ -130,22 +244,30 @@ class GeminiAuthHelper:
         """
         try:
             time.sleep(3)  # 等待页面完全加载
-            cookies = driver.get_cookies()
+            # 直接走 CDP，只取会发往工作台的 cookie
+            cookies = driver.execute_cdp_cmd("Network.getCookies", {"urls": [WORKSPACE_URL]})["cookies"]
             url = driver.current_url
-            parsed = urlparse(url)
-
-            # 解析 config_id
-            path_parts = url.split('/')
-            config_id = None
-            for i, p in enumerate(path_parts):
-                if p == 'cid' and i + 1 < len(path_parts):
-                    config_id = path_parts[i + 1].split('?')[0]
-                    break
 
-            cookie_dict = {c['name']: c for c in cookies}
-            ses_cookie = cookie_dict.get('__Secure-C_SES', {})
-            host_cookie = cookie_dict.get('__Host-C_OSES', {})
-            csesidx = parse_qs(parsed.query).get('csesidx', [None])[0]
+            # 解析 config_id 和 csesidx
+            cid_match = _CID_RE.search(url)
+            config_id = cid_match.group(1) if cid_match else None
+            csesidx_match = _CSESIDX_RE.search(url)
+            csesidx = unquote(csesidx_match.group(1)) if csesidx_match else None
+
+            # 只挑出需要的两个 cookie，找齐即停止
+            ses_cookie = host_cookie = None
+            for c in cookies:
+                name = c['name']
+                if name == '__Secure-C_SES':
+                    ses_cookie = c
+                elif name == '__Host-C_OSES':
+                    host_cookie = c
+                if ses_cookie and host_cookie:
+                    break
+            ses_cookie = ses_cookie or {}
+            host_cookie = host_cookie or {}
+            # CDP 返回的过期时间字段为 expires（会话 cookie 为 -1）
+            ses_expires = ses_cookie.get('expires', -1)
 
             if not all([ses_cookie.get('value'), host_cookie.get('value'), csesidx, config_id]):
                 return {"success": False, "config": None, "error": "配置数据不完整"}
@@ -156,8 +278,8 @@ class GeminiAuthHelper:
                 "secure_c_ses": ses_cookie.get('value'),
                 "host_c_oses": host_cookie.get('value'),
                 "expires_at": datetime.fromtimestamp(
-                    ses_cookie.get('expiry', 0) - 43200
-                ).strftime('%Y-%m-%d %H:%M:%S') if ses_cookie.get('expiry') else None
+                    ses_expires - 43200
+                ).strftime('%Y-%m-%d %H:%M:%S') if ses_expires > 0 else None
             }
 
             return {"success": True, "config": config_data, "error": None}
@@ -165,6 +287,42 @@ class GeminiAuthHelper:
         except Exception as e:
             return {"success": False, "config": None, "error": str(e)}
 
+    @staticmethod
+    def _is_page_crashed(driver) -> bool:
+        """
+        通过页面标题判断是否崩溃
+
+        只取 document.title，不再每次序列化整个 page_source；
+        标签页彻底崩溃时 Chrome 会直接抛出 tab crashed 异常，由调用方处理
+        """
+        title = (driver.execute_script("return document.title") or "").lower()
+        return 'crashed' in title or 'aw, snap' in title
+
+    def _check_workspace(self, driver) -> str:
+        """
+        检查一次是否已进入工作台
+
+        返回: "ready" 已进入 / "crashed" 页面崩溃 / "waiting" 继续等待
+        """
+        try:
+            # 检查页面是否崩溃
+            if self._is_page_crashed(driver):
+                logger.warning("⚠️ 等待工作台时页面崩溃")
+                return "crashed"
+
+            url = driver.current_url
+            if 'business.gemini.google' in url and '/cid/' in url:
+                return "ready"
+
+        except Exception as e:
+            error_msg = str(e).lower()
+            if 'crash' in error_msg or 'tab' in error_msg or 'target window' in error_msg:
+                logger.warning(f"⚠️ 等待工作台时检测到崩溃: {e}")
+                return "crashed"
+            # 其他异常继续等待
+
+        return "waiting"
+
     def wait_for_workspace(self, driver, timeout: int = 30, max_crash_retries: int = 3) -> bool:
         """
         等待进入工作台（公共方法，带崩溃重试）
@@ -177,49 +335,53 @@ class GeminiAuthHelper:
         返回: True 表示成功进入，False 表示超时或失败
         """
         crash_count = 0
-        workspace_url = "https://business.gemini.google/"
-        
+
         for _ in range(timeout):
             time.sleep(1)
-            try:
-                # 检查页面是否崩溃
-                page_source = driver.page_source
-                is_crashed = 'crashed' in page_source.lower() or 'aw, snap' in page_source.lower()
-                
-                if is_crashed:
-                    crash_count += 1
-                    logger.warning(f"⚠️ 等待工作台时页面崩溃，尝试开新标签页 (崩溃 {crash_count}/{max_crash_retries})")
-                    if crash_count >= max_crash_retries:
-                        logger.error("❌ 页面崩溃次数过多，放弃重试")
-                        return False
-                    
-                    # 开新标签页并切换
-                    if self._recover_from_crash(driver, workspace_url):
-                        time.sleep(3)
-                        continue
-                    else:
-                        return False
-                
-                url = driver.current_url
-                if 'business.gemini.google' in url and '/cid/' in url:
-                    return True
-                    
-            except Exception as e:
-                error_msg = str(e).lower()
-                if 'crash' in error_msg or 'tab' in error_msg or 'target window' in error_msg:
-                    crash_count += 1
-                    logger.warning(f"⚠️ 等待工作台时检测到崩溃: {e} (崩溃 {crash_count}/{max_crash_retries})")
-                    if crash_count >= max_crash_retries:
-                        logger.error("❌ 页面崩溃次数过多，放弃重试")
-                        return False
-                    
-                    if self._recover_from_crash(driver, workspace_url):
-                        time.sleep(3)
-                        continue
-                    else:
-                        return False
-                # 其他异常继续等待
-                
+            state = self._check_workspace(driver)
+            if state == "ready":
+                return True
+
+            if state == "crashed":
+                crash_count += 1
+                logger.warning(f"⚠️ 尝试开新标签页恢复 (崩溃 {crash_count}/{max_crash_retries})")
+                if crash_count >= max_crash_retries:
+                    logger.error("❌ 页面崩溃次数过多，放弃重试")
+                    return False
+
+                # 开新标签页并切换
+                if not self._recover_from_crash(driver, WORKSPACE_URL):
+                    return False
+                time.sleep(3)
+
+        return False
+
+    async def wait_for_workspace_async(self, driver, timeout: int = 30, max_crash_retries: int = 3) -> bool:
+        """
+        等待进入工作台（异步版本）
+
+        参数和返回值同 wait_for_workspace，轮询间隔期间不占用线程，只有浏览器调用放到线程中执行
+        """
+        crash_count = 0
+
+        for _ in range(timeout):
+            await asyncio.sleep(1)
+            state = await run_blocking(self._check_workspace, driver)
+            if state == "ready":
+                return True
+
+            if state == "crashed":
+                crash_count += 1
+                logger.warning(f"⚠️ 尝试开新标签页恢复 (崩溃 {crash_count}/{max_crash_retries})")
+                if crash_count >= max_crash_retries:
+                    logger.error("❌ 页面崩溃次数过多，放弃重试")
+                    return False
+
+                # 开新标签页并切换
+                if not await run_blocking(self._recover_from_crash, driver, WORKSPACE_URL):
+                    return False
+                await asyncio.sleep(3)
+
         return False
     
     def _recover_from_crash(self, driver, target_url: str) -> bool:
@@ -273,6 +435,23 @@ class GeminiAuthHelper:
             logger.error(f"❌ 恢复失败: {e}")
             return False
 
+    @staticmethod
+    def _wait_workspace_ready(driver, attempt: int, timeout: int = 10) -> None:
+        """
+        等待工作台加载完成（URL 含 /cid/ 且 readyState 为 complete）
+
+        就绪即返回；超时则按尝试次数指数退避（1s, 2s, 4s ... 最多 10s）后交给下一次重试
+        """
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.common.exceptions import TimeoutException
+
+        try:
+            WebDriverWait(driver, timeout).until(
+                lambda d: '/cid/' in d.current_url and d.execute_script("return document.readyState") == 'complete'
+            )
+        except TimeoutException:
+            time.sleep(min(2 ** attempt, 10))
+
     def extract_config_with_retry(self, driver, max_retries: int = 3) -> Dict[str, Any]:
         """
         带重试机制的配置提取（处理 tab crashed 问题）
@@ -291,11 +470,10 @@ class GeminiAuthHelper:
         for attempt in range(max_retries):
             try:
                 # 检查页面是否崩溃
-                page_source = driver.page_source
-                if 'crashed' in page_source.lower() or 'aw, snap' in page_source.lower():
+                if self._is_page_crashed(driver):
                     logger.warning(f"⚠️ 页面崩溃，尝试刷新 (尝试 {attempt + 1}/{max_retries})")
                     driver.refresh()
-                    time.sleep(3)
+                    self._wait_workspace_ready(driver, attempt)
                     continue
                 
                 extract_result = self.extract_config_from_workspace(driver)
@@ -305,7 +483,7 @@ class GeminiAuthHelper:
                     last_error = extract_result["error"]
                     logger.warning(f"⚠️ 提取配置失败: {last_error}，尝试刷新 (尝试 {attempt + 1}/{max_retries})")
                     driver.refresh()
-                    time.sleep(3)
+                    self._wait_workspace_ready(driver, attempt)
                     
             except Exception as e:
                 error_msg = str(e).lower()
@@ -313,12 +491,12 @@ class GeminiAuthHelper:
                     logger.warning(f"⚠️ 检测到页面崩溃: {e}，尝试刷新 (尝试 {attempt + 1}/{max_retries})")
                     try:
                         driver.refresh()
-                        time.sleep(3)
+                        self._wait_workspace_ready(driver, attempt)
                     except:
                         # 如果刷新也失败，尝试重新访问工作台
                         try:
-                            driver.get("https://business.gemini.google/")
-                            time.sleep(5)
+                            driver.get(WORKSPACE_URL)
+                            self._wait_workspace_ready(driver, attempt)
                         except:
                             pass
                 else:
@@ -326,7 +504,7 @@ class GeminiAuthHelper:
                     logger.warning(f"⚠️ 提取配置异常: {e}，尝试刷新 (尝试 {attempt + 1}/{max_retries})")
                     try:
                         driver.refresh()
-                        time.sleep(3)
+                        self._wait_workspace_ready(driver, attempt)
                     except:
                         pass
         
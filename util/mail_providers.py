@@ -7,22 +7,316 @@
 
 通过 MAIL_PROVIDER 环境变量选择使用哪种服务
 """
+import asyncio
+import functools
 import json
+import random
+import re
+import secrets
+import string
+import threading
 import time
 import logging
-from abc import ABC, abstractmethod
-from typing import Optional
+import weakref
+from typing import Awaitable, Callable, Dict, Optional, Protocol, Tuple, TypeVar, Union
 
-import requests
-from bs4 import BeautifulSoup
+import httpx
+
+try:
+    # orjson 可选，解析轮询返回的邮件列表更快，未安装时使用标准库
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+try:
+    # 安装了 h2 时启用 HTTP/2，多个邮箱同时轮询可复用同一条连接
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
 
 logger = logging.getLogger("gemini.mail_providers")
 
+# 验证码邮件中 <span class="verification-code">123456</span> 的内容
+_CODE_SPAN_RE = re.compile(
+    r'<span[^>]*class="[^"]*verification-code[^"]*"[^>]*>\s*(\d{6})\s*</span>', re.I
+)
+# 兜底：正文中任意独立的 6 位数字
+_CODE_RE = re.compile(r'\b(\d{6})\b')
+# 随机邮箱用户名字符集
+_USERNAME_ALPHABET = string.ascii_letters + string.digits
+
+
+def _random_mailbox_name() -> str:
+    """生成 10 位随机邮箱用户名（邮箱地址即账号标识，使用密码学安全随机数）"""
+    return ''.join(secrets.choice(_USERNAME_ALPHABET) for _ in range(10))
+
+
+def _create_client(headers: Optional[dict] = None, verify: Union[bool, str] = True) -> httpx.Client:
+    """
+    创建带连接池的 HTTP 客户端
+
+    验证码轮询时复用 TCP/TLS 连接，避免每次请求重新握手；连接失败时自动重试
+    """
+    transport = httpx.HTTPTransport(
+        http2=_HTTP2,
+        verify=verify,
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=4),
+        retries=2,
+    )
+    return httpx.Client(headers=headers, timeout=httpx.Timeout(10.0, connect=5.0), transport=transport)
+
+
+# 异步请求共用的客户端，首次使用时创建；AsyncClient 的连接绑定创建它的事件循环，
+# 因此按事件循环（循环结束后自动移除）和证书校验设置区分
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Union[bool, str], httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_async_client(verify: Union[bool, str] = True) -> httpx.AsyncClient:
+    """获取当前事件循环共享的异步 HTTP 客户端，跨请求复用连接"""
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(verify)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(http2=_HTTP2, verify=verify, timeout=httpx.Timeout(10.0, connect=5.0))
+        clients[verify] = client
+    return client
+
+
+async def close_async_clients() -> None:
+    """关闭当前事件循环中的共享异步客户端（应用关闭时调用）"""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+class _ClientLease:
+    """
+    记录 Provider 同步客户端正在进行的调用数
+
+    close() 时仍有调用在使用客户端（例如正在轮询验证码），等最后一个调用结束后再关闭
+    """
+
+    __slots__ = ('_client', '_active', '_closing', '_lock')
+
+    def __init__(self, client: httpx.Client):
+        self._client = client
+        self._active = 0
+        self._closing = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            self._active += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._active -= 1
+            close = self._closing and self._active == 0
+        if close:
+            self._client.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            close = self._active == 0
+        if close:
+            self._client.close()
+
+
+def _uses_client(method):
+    """Provider 方法装饰器：调用期间登记对 self._client 的使用，Provider 关闭时不会中断该调用"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._lease.acquire()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._lease.release()
+    return wrapper
+
+
+T = TypeVar("T")
 
-class MailProvider(ABC):
-    """邮箱服务抽象基类"""
 
-    @abstractmethod
+def _poll_for(
+    check: Callable[[], Optional[T]],
+    timeout: float,
+    interval: float = 1.0,
+    max_interval: float = 10.0,
+    label: str = "",
+    long_poll: float = 0,
+    max_failures: int = 0
+) -> Optional[T]:
+    """
+    反复调用 check() 直到返回非空结果或超时，超时返回 None
+
+    两次调用之间的间隔从 interval 开始每次乘以 1.5，直到 max_interval；
+    check() 抛出异常视为请求失败，只记录日志，下一轮继续；
+    连续失败 max_failures 次（0 表示不限）判定邮箱服务不可用，提前返回 None。
+    long_poll > 0 时，单次请求已被服务端挂起这么久则不再额外等待
+    """
+    start = time.time()
+    failures = 0
+    while time.time() - start < timeout:
+        polled_at = time.time()
+        try:
+            result = check()
+            failures = 0
+            if result:
+                return result
+        except Exception as e:
+            failures += 1
+            logger.debug(f"[{label}] 获取邮件异常: {e}")
+            if max_failures and failures >= max_failures:
+                logger.error(f"❌ [{label}] 连续 {failures} 次请求失败，邮箱服务可能不可用，停止等待")
+                return None
+
+        logger.debug(f"[{label}] 等待验证码... ({int(time.time() - start)}s)")
+        # 长轮询请求本身已等待过，直接发起下一次
+        if long_poll and time.time() - polled_at >= long_poll:
+            continue
+        # 邮件通常几秒内到达，先密后疏地轮询
+        time.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
+    return None
+
+
+async def _poll_for_async(
+    check: Callable[[], Awaitable[Optional[T]]],
+    timeout: float,
+    interval: float = 1.0,
+    max_interval: float = 10.0,
+    label: str = "",
+    long_poll: float = 0,
+    max_failures: int = 0
+) -> Optional[T]:
+    """_poll_for 的异步版本，等待期间让出事件循环"""
+    start = time.time()
+    failures = 0
+    while time.time() - start < timeout:
+        polled_at = time.time()
+        try:
+            result = await check()
+            failures = 0
+            if result:
+                return result
+        except Exception as e:
+            failures += 1
+            logger.debug(f"[{label}] 获取邮件异常: {e}")
+            if max_failures and failures >= max_failures:
+                logger.error(f"❌ [{label}] 连续 {failures} 次请求失败，邮箱服务可能不可用，停止等待")
+                return None
+
+        if long_poll and time.time() - polled_at >= long_poll:
+            continue
+        await asyncio.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
+    return None
+
+
+class _SharedPoller:
+    """
+    多个协程同时等待验证码时共用一个轮询循环
+
+    每轮调用一次 fetch(pending, refresh) 拉取邮件（pending 为 {邮箱: 发件人}），返回 {邮箱: 验证码}，
+    分发给所有等待中的邮箱；新邮箱加入时立即轮询一次（refresh=True）并重置间隔，没有等待者时循环退出。
+    连续失败 max_failures 次（0 表示不限）时所有等待中的邮箱返回 None
+    """
+
+    __slots__ = (
+        '_fetch', 'label', 'initial_interval', 'max_interval', 'max_failures',
+        '_loop', '_waiters', '_wakeup', '_task',
+    )
+
+    def __init__(
+        self,
+        fetch: Callable[[Dict[str, str], bool], Awaitable[Dict[str, str]]],
+        label: str,
+        initial_interval: float = 1.0,
+        max_interval: float = 10.0,
+        max_failures: int = 0
+    ):
+        self._fetch = fetch
+        self.label = label
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.max_failures = max_failures
+        # 等待状态绑定到首次使用的事件循环
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def wait(self, email: str, sender: str, timeout: float) -> Optional[str]:
+        """等待 email 收到 sender 发来的验证码，超时返回 None"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._waiters = {}
+            self._wakeup = asyncio.Event()
+            self._task = None
+
+        future = loop.create_future()
+        self._waiters[email] = (sender, future)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if self._waiters.get(email, (None, None))[1] is future:
+                del self._waiters[email]
+
+    async def _run(self) -> None:
+        interval = self.initial_interval
+        failures = 0
+        refresh = False
+        while self._waiters:
+            if self._wakeup.is_set():
+                self._wakeup.clear()
+                refresh = True
+                interval = self.initial_interval
+
+            pending = {email: sender for email, (sender, _) in self._waiters.items()}
+            try:
+                codes = await self._fetch(pending, refresh)
+                failures = 0
+                refresh = False
+            except Exception as e:
+                failures += 1
+                logger.debug(f"[{self.label}] 获取邮件异常: {e}")
+                if self.max_failures and failures >= self.max_failures:
+                    logger.error(f"❌ [{self.label}] 连续 {failures} 次请求失败，邮箱服务可能不可用，停止等待")
+                    codes = dict.fromkeys(pending)
+                else:
+                    codes = {}
+
+            for email, code in codes.items():
+                waiter = self._waiters.pop(email, None)
+                if waiter and not waiter[1].done():
+                    waiter[1].set_result(code)
+
+            if not self._waiters:
+                break
+            logger.debug(f"[{self.label}] 等待 {len(self._waiters)} 个邮箱的验证码...")
+            # 新邮箱加入时提前结束等待
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                interval = min(interval * 1.5, self.max_interval)
+
+
+class MailProvider(Protocol):
+    """邮箱服务接口（结构化类型，具体服务只需实现这些方法，无需继承）"""
+
     def create_email(self, domain: Optional[str] = None) -> Optional[str]:
         """
         创建临时邮箱
@@ -33,9 +327,16 @@ class MailProvider(ABC):
         Returns:
             邮箱地址，失败返回 None
         """
-        pass
+        ...
+
+    async def create_email_async(self, domain: Optional[str] = None) -> Optional[str]:
+        """
+        创建临时邮箱（异步版本）
+
+        参数和返回值同 create_email
+        """
+        ...
 
-    @abstractmethod
     def get_verification_code(self, email: str, sender: str, timeout: int = 60) -> Optional[str]:
         """
         获取验证码
@@ -48,9 +349,16 @@ class MailProvider(ABC):
         Returns:
             验证码字符串，失败返回 None
         """
-        pass
+        ...
+
+    async def get_verification_code_async(self, email: str, sender: str, timeout: int = 60) -> Optional[str]:
+        """
+        获取验证码（异步版本）
+
+        参数和返回值同 get_verification_code，轮询间隔期间让出事件循环而不是阻塞线程
+        """
+        ...
 
-    @abstractmethod
     def supports_refresh(self) -> bool:
         """
         是否支持刷新 token（邮箱是否持久化）
@@ -58,16 +366,19 @@ class MailProvider(ABC):
         如果邮箱是临时的（用完即弃），返回 False
         如果邮箱是持久化的（可以持续接收邮件），返回 True
         """
-        pass
+        ...
+
+    def close(self) -> None:
+        """关闭 HTTP 客户端，释放连接（正在进行的调用结束后才真正关闭）"""
+        ...
 
     @property
-    @abstractmethod
     def name(self) -> str:
         """服务名称"""
-        pass
+        ...
 
 
-class CloudflareMailProvider(MailProvider):
+class CloudflareMailProvider:
     """
     Cloudflare Worker 临时邮箱服务
 
@@ -76,7 +387,22 @@ class CloudflareMailProvider(MailProvider):
     - GET /admin/mails - 获取邮件列表
     """
 
-    def __init__(self, api_url: str, admin_key: str, email_domains: list, supports_refresh: bool = True):
+    __slots__ = (
+        'api_url', 'admin_key', 'email_domains', '_supports_refresh', '_client', '_lease', '_verify',
+        'initial_interval', 'max_interval', 'max_consecutive_failures', '_etag', '_poller',
+    )
+
+    def __init__(
+        self,
+        api_url: str,
+        admin_key: str,
+        email_domains: list,
+        supports_refresh: bool = True,
+        initial_interval: float = 1.0,
+        max_interval: float = 10.0,
+        ca_bundle: Optional[str] = None,
+        max_consecutive_failures: int = 5
+    ):
         """
         初始化 Cloudflare 邮箱服务
 
@@ -85,19 +411,40 @@ class CloudflareMailProvider(MailProvider):
             admin_key: 管理员密钥
             email_domains: 可用域名列表
             supports_refresh: 是否支持刷新（默认 True，假设是持久化服务）
+            initial_interval: 验证码首次轮询间隔（秒）
+            max_interval: 验证码轮询间隔上限（秒），间隔每次乘以 1.5 直到该值
+            ca_bundle: CA 证书文件路径（默认使用系统证书校验）
+            max_consecutive_failures: 等待验证码时连续请求失败多少次后放弃（0 表示不限）
         """
         self.api_url = api_url.rstrip('/')
         self.admin_key = admin_key
         self.email_domains = email_domains if email_domains else []
         self._supports_refresh = supports_refresh
+        # 客户端级别开启证书校验，连接池复用已校验的 TLS 连接
+        self._verify = ca_bundle or True
+        # 每个服务独立的客户端，认证头只设置一次
+        self._client = _create_client({"x-admin-auth": admin_key}, self._verify)
+        self._lease = _ClientLease(self._client)
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.max_consecutive_failures = max_consecutive_failures
+        # 异步等待共用一个轮询循环：每轮只请求一次邮件列表，分发给所有等待中的邮箱
+        self._etag: Optional[str] = None
+        self._poller = _SharedPoller(
+            self._fetch_codes, "Cloudflare", initial_interval, max_interval, max_consecutive_failures
+        )
 
     @property
     def name(self) -> str:
         return "cloudflare"
 
+    def close(self) -> None:
+        self._lease.close()
+
     def supports_refresh(self) -> bool:
         return self._supports_refresh
 
+    @_uses_client
     def create_email(self, domain: Optional[str] = None) -> Optional[str]:
         """创建临时邮箱"""
         if not self.api_url or not self.admin_key:
@@ -109,11 +456,8 @@ class CloudflareMailProvider(MailProvider):
             return None
 
         try:
-            import random
-            from string import ascii_letters, digits
-
             # 生成随机用户名
-            random_name = ''.join(random.sample(ascii_letters + digits, 10))
+            random_name = _random_mailbox_name()
 
             # 如果未指定域名，从列表中随机选择
             if not domain:
@@ -125,16 +469,15 @@ class CloudflareMailProvider(MailProvider):
                 "domain": domain
             }
 
-            r = requests.post(
+            r = self._client.post(
                 f"{self.api_url}/admin/new_address",
-                headers={"x-admin-auth": self.admin_key},
                 json=json_data,
-                timeout=30,
-                verify=False
+                timeout=30
             )
 
             if r.status_code == 200:
-                email = r.json().get('address')
+                payload = _loads(r.content)
+                email = payload.get('address')
                 logger.info(f"✅ Cloudflare 邮箱创建成功: {email}")
                 return email
             else:
@@ -145,41 +488,128 @@ class CloudflareMailProvider(MailProvider):
 
         return None
 
-    def get_verification_code(self, email: str, sender: str, timeout: int = 60) -> Optional[str]:
-        """获取验证码"""
-        logger.info(f"⏳ [Cloudflare] 等待验证码 [{email}]...")
-        start = time.time()
+    async def create_email_async(self, domain: Optional[str] = None) -> Optional[str]:
+        """创建临时邮箱（异步版本）"""
+        if not self.api_url or not self.admin_key:
+            logger.error("❌ Cloudflare 邮箱 API 未配置")
+            return None
 
-        while time.time() - start < timeout:
-            try:
-                r = requests.get(
-                    f"{self.api_url}/admin/mails?limit=20&offset=0",
-                    headers={"x-admin-auth": self.admin_key},
-                    timeout=10,
-                    verify=False
-                )
-
-                if r.status_code == 200:
-                    emails = r.json().get('results', {})
-                    for mail in emails:
-                        if mail.get("address") == email and mail.get("source") == sender:
-                            metadata = json.loads(mail["metadata"])
-                            code = metadata["ai_extract"]["result"]
-                            logger.info(f"✅ [Cloudflare] 验证码获取成功: {code}")
-                            return code
+        if not self.email_domains:
+            logger.error("❌ Cloudflare 邮箱域名未配置")
+            return None
 
-            except Exception as e:
-                logger.debug(f"[Cloudflare] 获取邮件异常: {e}")
+        try:
+            random_name = _random_mailbox_name()
+            if not domain:
+                domain = random.choice(self.email_domains)
 
-            time.sleep(2)
+            r = await _get_async_client(verify=self._verify).post(
+                f"{self.api_url}/admin/new_address",
+                headers={"x-admin-auth": self.admin_key},
+                json={"enablePrefix": False, "name": random_name, "domain": domain},
+                timeout=30
+            )
 
-        logger.error(f"❌ [Cloudflare] 验证码超时 [{email}]")
-        return None
+            if r.status_code == 200:
+                payload = _loads(r.content)
+                email = payload.get('address')
+                logger.info(f"✅ Cloudflare 邮箱创建成功: {email}")
+                return email
+            else:
+                logger.error(f"❌ Cloudflare 邮箱创建失败: {r.status_code} - {r.text}")
 
+        except Exception as e:
+            logger.error(f"❌ Cloudflare 邮箱创建异常: {e}")
 
-class ChatGPTMailProvider(MailProvider):
+        return None
+
+    def _find_code(self, payload: dict, email: str, sender: str) -> Optional[str]:
+        """从邮件列表中找出目标邮箱的验证码"""
+        for mail in payload.get('results', []):
+            if mail.get("address") == email and mail.get("source") == sender:
+                metadata = _loads(mail["metadata"])
+                return metadata["ai_extract"]["result"]
+        return None
 
-    def __init__(self, api_url: str = "", api_key: str = "", supports_refresh: bool = True):
+    @_uses_client
+    def get_verification_code(self, email: str, sender: str, timeout: int = 60) -> Optional[str]:
+        """获取验证码"""
+        logger.info(f"⏳ [Cloudflare] 等待验证码 [{email}]...")
+        # 邮件列表未变化时服务端返回 304，跳过下载和 JSON 解析
+        etag = None
+
+        def check() -> Optional[str]:
+            nonlocal etag
+            r = self._client.get(
+                f"{self.api_url}/admin/mails?limit=20&offset=0",
+                headers={"If-None-Match": etag} if etag else None
+            )
+            if r.status_code == 304:
+                return None
+            if r.status_code != 200:
+                raise RuntimeError(f"API 响应错误: {r.status_code}")
+            etag = r.headers.get("ETag")
+            return self._find_code(_loads(r.content), email, sender)
+
+        code = _poll_for(
+            check, timeout, self.initial_interval, self.max_interval, "Cloudflare",
+            max_failures=self.max_consecutive_failures
+        )
+        if code:
+            logger.info(f"✅ [Cloudflare] 验证码获取成功: {code}")
+        else:
+            logger.error(f"❌ [Cloudflare] 验证码超时 [{email}]")
+        return code
+
+    async def _fetch_codes(self, pending: Dict[str, str], refresh: bool) -> Dict[str, str]:
+        """拉取一次邮件列表，返回 pending 中已收到验证码的邮箱（refresh 为 True 时不带 ETag，重新下载）"""
+        headers = {"x-admin-auth": self.admin_key}
+        if self._etag and not refresh:
+            headers["If-None-Match"] = self._etag
+        r = await _get_async_client(verify=self._verify).get(
+            f"{self.api_url}/admin/mails?limit=100&offset=0", headers=headers
+        )
+        if r.status_code == 304:
+            return {}
+        if r.status_code != 200:
+            raise RuntimeError(f"API 响应错误: {r.status_code}")
+        self._etag = r.headers.get("ETag")
+
+        codes: Dict[str, str] = {}
+        for mail in _loads(r.content).get('results', []):
+            email = mail.get("address")
+            if email in pending and email not in codes and mail.get("source") == pending[email]:
+                codes[email] = _loads(mail["metadata"])["ai_extract"]["result"]
+        return codes
+
+    async def get_verification_code_async(self, email: str, sender: str, timeout: int = 60) -> Optional[str]:
+        """获取验证码（异步版本，同时等待的多个邮箱共用同一轮邮件列表请求）"""
+        logger.info(f"⏳ [Cloudflare] 等待验证码 [{email}]...")
+        code = await self._poller.wait(email, sender, timeout)
+        if code:
+            logger.info(f"✅ [Cloudflare] 验证码获取成功: {code}")
+        else:
+            logger.error(f"❌ [Cloudflare] 验证码超时 [{email}]")
+        return code
+
+
+class ChatGPTMailProvider:
+
+    __slots__ = (
+        'api_url', 'api_key', '_supports_refresh', '_client', '_lease',
+        'initial_interval', 'max_interval', 'long_poll_wait', 'max_consecutive_failures',
+    )
+
+    def __init__(
+        self,
+        api_url: str = "",
+        api_key: str = "",
+        supports_refresh: bool = True,
+        initial_interval: float = 1.0,
+        max_interval: float = 10.0,
+        long_poll_wait: int = 0,
+        max_consecutive_failures: int = 5
+    ):
         """
         初始化 ChatGPT Mail 服务
 
@@ -187,29 +617,72 @@ class ChatGPTMailProvider(MailProvider):
             api_url: API 基础 URL
             api_key: API 密钥
             supports_refresh: 是否支持刷新（默认 True）
+            initial_interval: 验证码首次轮询间隔（秒）
+            max_interval: 验证码轮询间隔上限（秒），间隔每次乘以 1.5 直到该值
+            long_poll_wait: 长轮询等待时间（秒），查询时带上 wait 参数让服务端等到新邮件再返回，0 表示不使用
+            max_consecutive_failures: 等待验证码时连续请求失败多少次后放弃（0 表示不限）
         """
         self.api_url = api_url.rstrip('/')
         self.api_key = api_key
         self._supports_refresh = supports_refresh
+        # 每个服务独立的客户端，认证头只设置一次
+        self._client = _create_client({"X-API-Key": api_key})
+        self._lease = _ClientLease(self._client)
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.long_poll_wait = long_poll_wait
+        self.max_consecutive_failures = max_consecutive_failures
 
     @property
     def name(self) -> str:
         return "chatgpt"
 
+    def close(self) -> None:
+        self._lease.close()
+
     def supports_refresh(self) -> bool:
         return self._supports_refresh
 
+    def _email_params(self, email: str) -> dict:
+        """邮件查询参数，开启长轮询时带上 wait"""
+        if self.long_poll_wait:
+            return {"email": email, "wait": self.long_poll_wait}
+        return {"email": email}
+
+    @_uses_client
     def create_email(self, domain: Optional[str] = None) -> Optional[str]:
         """创建临时邮箱（domain 参数在此服务中被忽略）"""
         try:
-            r = requests.get(
+            r = self._client.get(
+                f"{self.api_url}/api/generate-email",
+                timeout=30
+            )
+
+            payload = _loads(r.content) if r.status_code == 200 else {}
+            if payload.get('success'):
+                email = payload['data']['email']
+                logger.info(f"✅ [ChatGPT Mail] 邮箱创建成功: {email}")
+                return email
+            else:
+                logger.error(f"❌ [ChatGPT Mail] 邮箱创建失败: {r.status_code} - {r.text}")
+
+        except Exception as e:
+            logger.error(f"❌ [ChatGPT Mail] 邮箱创建异常: {e}")
+
+        return None
+
+    async def create_email_async(self, domain: Optional[str] = None) -> Optional[str]:
+        """创建临时邮箱（异步版本，domain 参数在此服务中被忽略）"""
+        try:
+            r = await _get_async_client().get(
                 f"{self.api_url}/api/generate-email",
                 headers={"X-API-Key": self.api_key},
                 timeout=30
             )
 
-            if r.status_code == 200 and r.json().get('success'):
-                email = r.json()['data']['email']
+            payload = _loads(r.content) if r.status_code == 200 else {}
+            if payload.get('success'):
+                email = payload['data']['email']
                 logger.info(f"✅ [ChatGPT Mail] 邮箱创建成功: {email}")
                 return email
             else:
@@ -220,57 +693,79 @@ class ChatGPTMailProvider(MailProvider):
 
         return None
 
+    def _extract_code(self, response_data: dict) -> Optional[str]:
+        """从最新一封邮件中提取验证码"""
+        emails = response_data.get('data', {}).get('emails', [])
+        if not emails:
+            logger.debug(f"[ChatGPT Mail] 暂无邮件")
+            return None
+
+        latest_email = emails[0]
+        html = latest_email.get('html_content') or ''
+        text = latest_email.get('content') or ''
+        if not html and not text:
+            logger.debug(f"[ChatGPT Mail] 邮件内容为空: {latest_email.get('subject', 'no subject')}")
+            return None
+
+        span_match = _CODE_SPAN_RE.search(html) if html else None
+        if span_match:
+            code = span_match.group(1)
+            logger.info(f"✅ [ChatGPT Mail] 验证码获取成功: {code}")
+            return code
+
+        # 纯文本正文短且没有样式，优先在其中查找，避免 HTML 中的颜色值（如 #123456）被误匹配
+        code_match = (text and _CODE_RE.search(text)) or (html and _CODE_RE.search(html))
+        if code_match:
+            code = code_match.group(1)
+            logger.info(f"✅ [ChatGPT Mail] 验证码(正则匹配)获取成功: {code}")
+            return code
+        return None
+
+    @_uses_client
     def get_verification_code(self, email: str, sender: str, timeout: int = 60) -> Optional[str]:
         logger.info(f"⏳ [ChatGPT Mail] 等待验证码 [{email}]...")
-        start = time.time()
 
-        while time.time() - start < timeout:
-            try:
-                r = requests.get(
-                    f"{self.api_url}/api/emails",
-                    params={"email": email},
-                    headers={"X-API-Key": self.api_key},
-                    timeout=10
-                )
-
-                if r.status_code == 200:
-                    response_data = r.json()
-                    emails = response_data.get('data', {}).get('emails', [])
-                    
-                    if emails:
-                        latest_email = emails[0]
-                        html = latest_email.get('html_content') or latest_email.get('content', '')
-                        
-                        if html:
-                            soup = BeautifulSoup(html, 'html.parser')
-                            span = soup.find('span', class_='verification-code')
-                            if span:
-                                code = span.get_text().strip()
-                                if len(code) == 6:
-                                    logger.info(f"✅ [ChatGPT Mail] 验证码获取成功: {code}")
-                                    return code
-                            
-                            import re
-                            code_match = re.search(r'\b(\d{6})\b', html)
-                            if code_match:
-                                code = code_match.group(1)
-                                logger.info(f"✅ [ChatGPT Mail] 验证码(正则匹配)获取成功: {code}")
-                                return code
-                        else:
-                            logger.debug(f"[ChatGPT Mail] 邮件内容为空: {latest_email.get('subject', 'no subject')}")
-                    else:
-                        logger.debug(f"[ChatGPT Mail] 暂无邮件")
-                else:
-                    logger.debug(f"[ChatGPT Mail] API 响应错误: {r.status_code}")
+        def check() -> Optional[str]:
+            r = self._client.get(
+                f"{self.api_url}/api/emails",
+                params=self._email_params(email),
+                timeout=10 + self.long_poll_wait
+            )
+            if r.status_code != 200:
+                raise RuntimeError(f"API 响应错误: {r.status_code}")
+            return self._extract_code(_loads(r.content))
 
-            except Exception as e:
-                logger.debug(f"[ChatGPT Mail] 获取邮件异常: {e}")
+        code = _poll_for(
+            check, timeout, self.initial_interval, self.max_interval, "ChatGPT Mail", self.long_poll_wait,
+            max_failures=self.max_consecutive_failures
+        )
+        if not code:
+            logger.error(f"❌ [ChatGPT Mail] 验证码超时 [{email}]")
+        return code
 
-            print(f"  等待验证码... ({int(time.time() - start)}s)", end='\r')
-            time.sleep(2)
+    async def get_verification_code_async(self, email: str, sender: str, timeout: int = 60) -> Optional[str]:
+        """获取验证码（异步版本，轮询等待期间不占用线程）"""
+        logger.info(f"⏳ [ChatGPT Mail] 等待验证码 [{email}]...")
+        client = _get_async_client()
 
-        logger.error(f"❌ [ChatGPT Mail] 验证码超时 [{email}]")
-        return None
+        async def check() -> Optional[str]:
+            r = await client.get(
+                f"{self.api_url}/api/emails",
+                params=self._email_params(email),
+                headers={"X-API-Key": self.api_key},
+                timeout=10 + self.long_poll_wait
+            )
+            if r.status_code != 200:
+                raise RuntimeError(f"API 响应错误: {r.status_code}")
+            return self._extract_code(_loads(r.content))
+
+        code = await _poll_for_async(
+            check, timeout, self.initial_interval, self.max_interval, "ChatGPT Mail", self.long_poll_wait,
+            max_failures=self.max_consecutive_failures
+        )
+        if not code:
+            logger.error(f"❌ [ChatGPT Mail] 验证码超时 [{email}]")
+        return code
 
 
 # ==================== 工厂函数 ====================
@@ -282,7 +777,9 @@ def get_mail_provider(
     cloudflare_email_domains: Optional[list] = None,
     chatgpt_api_url: str = "",
     chatgpt_api_key: str = "",
-    supports_refresh: bool = True
+    supports_refresh: bool = True,
+    cloudflare_ca_bundle: Optional[str] = None,
+    chatgpt_long_poll_wait: int = 0
 ) -> Optional[MailProvider]:
     """
     获取邮箱服务提供者
@@ -304,7 +801,8 @@ def get_mail_provider(
             api_url=cloudflare_api_url,
             admin_key=cloudflare_admin_key,
             email_domains=cloudflare_email_domains or [],
-            supports_refresh=supports_refresh
+            supports_refresh=supports_refresh,
+            ca_bundle=cloudflare_ca_bundle
         )
 
     elif provider_type == "chatgpt":
@@ -314,7 +812,8 @@ def get_mail_provider(
         return ChatGPTMailProvider(
             api_url=chatgpt_api_url,
             api_key=chatgpt_api_key,
-            supports_refresh=supports_refresh
+            supports_refresh=supports_refresh,
+            long_poll_wait=chatgpt_long_poll_wait
         )
 
     else:
@@ -322,40 +821,77 @@ def get_mail_provider(
         return None
 
 
+# 决定 Provider 的邮箱配置字段，只有这些字段变化时才重新创建
+_MAIL_CONFIG_FIELDS = (
+    "mail_provider", "mail_provider_supports_refresh", "mail_api", "mail_admin_key",
+    "email_domain", "chatgpt_mail_api", "chatgpt_mail_key",
+    "mail_ca_bundle", "chatgpt_mail_long_poll",
+)
+
+# 最近一次按配置创建的 Provider：(邮箱配置字段取值, Provider)
+# Provider 由这里统一持有，调用方不应关闭它；邮箱配置变化时关闭被替换下来的 Provider，
+# 仍在轮询的调用会继续完成，最后一个调用结束后才真正释放连接
+_provider_cache: Optional[Tuple[tuple, Optional[MailProvider]]] = None
+_provider_cache_lock = threading.Lock()
+
+
+def _mail_config_key(cfg) -> tuple:
+    """提取邮箱相关配置，列表转成元组以便比较"""
+    return tuple(
+        tuple(value) if isinstance(value, list) else value
+        for value in (getattr(cfg, name) for name in _MAIL_CONFIG_FIELDS)
+    )
+
+
 def create_mail_provider_from_config() -> Optional[MailProvider]:
     """
     从配置创建邮箱服务提供者
 
     读取 core.config 中的配置，自动选择并初始化对应的 Provider
+    邮箱相关配置未变化时复用上次创建的 Provider（及其 HTTP 客户端），保存其他设置不会替换它
     """
+    global _provider_cache
     from core.config import config
 
-    provider_type = config.basic.mail_provider
-    supports_refresh = config.basic.mail_provider_supports_refresh
+    cfg = config.basic
+    key = _mail_config_key(cfg)
+    cached = _provider_cache
+    if cached is not None and cached[0] == key:
+        return cached[1]
 
-    if provider_type == "cloudflare":
-        return get_mail_provider(
-            provider_type="cloudflare",
-            cloudflare_api_url=config.basic.mail_api,
-            cloudflare_admin_key=config.basic.mail_admin_key,
-            cloudflare_email_domains=config.basic.email_domain,
-            supports_refresh=supports_refresh
-        )
+    with _provider_cache_lock:
+        cached = _provider_cache
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        provider = _build_mail_provider(cfg)
+        _provider_cache = (key, provider)
 
-    elif provider_type == "chatgpt":
+    if cached is not None and cached[1] is not None:
+        cached[1].close()
+    return provider
+
+
+def _build_mail_provider(cfg) -> Optional[MailProvider]:
+    """按 config.basic 快照创建 Provider"""
+    provider_type = cfg.mail_provider
+    supports_refresh = cfg.mail_provider_supports_refresh
+
+    if provider_type == "chatgpt":
         return get_mail_provider(
             provider_type="chatgpt",
-            chatgpt_api_url=config.basic.chatgpt_mail_api,
-            chatgpt_api_key=config.basic.chatgpt_mail_key,
-            supports_refresh=supports_refresh
+            chatgpt_api_url=cfg.chatgpt_mail_api,
+            chatgpt_api_key=cfg.chatgpt_mail_key,
+            supports_refresh=supports_refresh,
+            chatgpt_long_poll_wait=cfg.chatgpt_mail_long_poll
         )
 
-    else:
+    if provider_type != "cloudflare":
         logger.warning(f"⚠️ 未配置邮箱服务类型，默认使用 cloudflare")
-        return get_mail_provider(
-            provider_type="cloudflare",
-            cloudflare_api_url=config.basic.mail_api,
-            cloudflare_admin_key=config.basic.mail_admin_key,
-            cloudflare_email_domains=config.basic.email_domain,
-            supports_refresh=supports_refresh
-        )
+    return get_mail_provider(
+        provider_type="cloudflare",
+        cloudflare_api_url=cfg.mail_api,
+        cloudflare_admin_key=cfg.mail_admin_key,
+        cloudflare_email_domains=cfg.email_domain,
+        supports_refresh=supports_refresh,
+        cloudflare_ca_bundle=cfg.mail_ca_bundle or None
+    )